@@ -0,0 +1,141 @@
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import psutil
+import pytest
+from fastapi.testclient import TestClient
+
+# Add backend directory to sys.path so that 'main' can be imported
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Benchmarks get their own scratch SQLite DB and upload dir, never the dev ones.
+_WORK_DIR = tempfile.mkdtemp(prefix="analytics-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_WORK_DIR, 'bench.db')}"
+
+from main import app  # noqa: E402
+from database import Base, engine, SessionLocal  # noqa: E402
+from models import FileDB  # noqa: E402
+from csv_schema import infer_schema  # noqa: E402
+from routers import files  # noqa: E402
+
+from datagen import SHAPES, ensure_dataset  # noqa: E402
+
+DATA_DIR = os.getenv("BENCH_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".data"))
+# Comma-separated dataset sizes in MB, e.g. "1,100,2048" for a multi-GB run.
+SIZES_MB = [float(s) for s in os.getenv("BENCH_SIZES_MB", "1,10").split(",") if s.strip()]
+ROUNDS = int(os.getenv("BENCH_ROUNDS", "3"))
+
+
+class PeakRSS:
+    """Samples process RSS in a background thread while the block runs.
+
+    ``peak_delta_mb`` is the high-water mark above the RSS at entry.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self._interval = interval
+        self._process = psutil.Process()
+        self._stop = threading.Event()
+        self.baseline = 0
+        self.peak = 0
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self._process.memory_info().rss)
+            time.sleep(self._interval)
+
+    def __enter__(self):
+        self.baseline = self.peak = self._process.memory_info().rss
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self._process.memory_info().rss)
+
+    @property
+    def peak_delta_mb(self) -> float:
+        return (self.peak - self.baseline) / (1024 * 1024)
+
+
+def pytest_generate_tests(metafunc):
+    if "dataset" in metafunc.fixturenames:
+        params = [(shape, size) for size in SIZES_MB for shape in SHAPES]
+        ids = [f"{shape}-{size:g}mb" for shape, size in params]
+        metafunc.parametrize("dataset", params, ids=ids, indirect=True)
+
+
+@pytest.fixture(scope="session")
+def client():
+    files.UPLOAD_DIR = os.path.join(_WORK_DIR, "uploads")
+    os.makedirs(files.UPLOAD_DIR, exist_ok=True)
+    Base.metadata.create_all(bind=engine)
+    with TestClient(app) as test_client:
+        yield test_client
+    engine.dispose()
+    shutil.rmtree(_WORK_DIR, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def auth(client):
+    client.post("/register", json={"username": "bench", "email": "bench@example.com", "password": "bench"})
+    token = client.post("/token", data={"username": "bench", "password": "bench"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    user_id = client.get("/users/me", headers=headers).json()["id"]
+    return {"headers": headers, "user_id": user_id}
+
+
+@pytest.fixture(scope="session")
+def dataset(request):
+    """Path to a generated CSV for the parametrized (shape, size_mb)."""
+    shape, size_mb = request.param
+    return ensure_dataset(DATA_DIR, shape, size_mb)
+
+
+@pytest.fixture(scope="session")
+def dataset_schema(dataset):
+    return infer_schema(dataset)
+
+
+@pytest.fixture
+def registered_file(dataset, dataset_schema, auth):
+    """Register ``dataset`` as a file owned by the bench user without copying it."""
+    db = SessionLocal()
+    try:
+        db_file = FileDB(
+            filename=f"{os.path.basename(dataset)}-{time.monotonic_ns()}.csv",
+            filepath=dataset,
+            owner_id=auth["user_id"],
+            column_schema=dataset_schema,
+        )
+        db.add(db_file)
+        db.commit()
+        db.refresh(db_file)
+        yield db_file.id
+        db.delete(db_file)
+        db.commit()
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def profiled(benchmark):
+    """Run ``fn`` once under :class:`PeakRSS`, then benchmark it for ``BENCH_ROUNDS`` rounds."""
+
+    def run(fn, setup=None):
+        if setup is not None:
+            setup()
+        with PeakRSS() as rss:
+            fn()
+        benchmark.extra_info["peak_rss_delta_mb"] = round(rss.peak_delta_mb, 2)
+        if setup is not None:
+            return benchmark.pedantic(fn, setup=setup, rounds=ROUNDS, iterations=1)
+        return benchmark.pedantic(fn, rounds=ROUNDS, iterations=1)
+
+    return run
@@ -0,0 +1,124 @@
+"""Synthetic CSV generator for the benchmark suite.
+
+Files are generated in chunks until they reach a target size, so multi-GB
+datasets never need to fit in memory. Output is deterministic for a given
+(shape, size, seed) and cached on disk.
+
+Usage:
+    python benchmarks/datagen.py --shape wide --size-mb 1024 --out wide_1gb.csv
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+SHAPES = ("narrow", "wide", "string_heavy", "null_heavy")
+
+CHUNK_ROWS = 50_000
+PROBE_ROWS = 500
+WIDE_FLOAT_COLUMNS = 150
+WIDE_INT_COLUMNS = 50
+
+REGIONS = np.array(["north", "south", "east", "west", "central", "emea", "apac", "latam"])
+WORDS = np.array(
+    "alpha bravo charlie delta echo foxtrot golf hotel india juliet kilo lima mike november "
+    "oscar papa quebec romeo sierra tango uniform victor whiskey xray yankee zulu data flow "
+    "report metric customer order invoice shipment revenue forecast quarter region".split()
+)
+
+
+def _sentences(rng: np.random.Generator, nrows: int, words: int) -> list:
+    picked = WORDS[rng.integers(0, len(WORDS), size=(nrows, words))]
+    return [" ".join(row) for row in picked]
+
+
+def _with_nulls(rng: np.random.Generator, values: pd.Series, fraction: float) -> pd.Series:
+    return values.mask(rng.random(len(values)) < fraction)
+
+
+def _chunk(shape: str, rng: np.random.Generator, start: int, nrows: int) -> pd.DataFrame:
+    ids = np.arange(start, start + nrows)
+
+    if shape == "narrow":
+        return pd.DataFrame({
+            "id": ids,
+            "quantity": rng.integers(0, 1000, nrows),
+            "price": rng.normal(50, 15, nrows).round(2),
+            "active": rng.random(nrows) < 0.5,
+            "region": REGIONS[rng.integers(0, len(REGIONS), nrows)],
+        })
+
+    if shape == "wide":
+        data = {"id": ids}
+        for i in range(WIDE_FLOAT_COLUMNS):
+            data[f"f{i}"] = rng.normal(0, 1, nrows).round(4)
+        for i in range(WIDE_INT_COLUMNS):
+            data[f"i{i}"] = rng.integers(0, 10_000, nrows)
+        return pd.DataFrame(data)
+
+    if shape == "string_heavy":
+        return pd.DataFrame({
+            "id": ids,
+            "region": REGIONS[rng.integers(0, len(REGIONS), nrows)],
+            "customer": _sentences(rng, nrows, 2),
+            "title": _sentences(rng, nrows, 6),
+            "comment": _sentences(rng, nrows, 20),
+        })
+
+    if shape == "null_heavy":
+        dates = pd.Timestamp("2020-01-01") + pd.to_timedelta(rng.integers(0, 1500, nrows), unit="D")
+        return pd.DataFrame({
+            "id": ids,
+            "score": _with_nulls(rng, pd.Series(rng.integers(0, 100, nrows)), 0.6).astype("Int64"),
+            "amount": _with_nulls(rng, pd.Series(rng.normal(100, 30, nrows).round(2)), 0.5),
+            "region": _with_nulls(rng, pd.Series(REGIONS[rng.integers(0, len(REGIONS), nrows)]), 0.4),
+            "note": _with_nulls(rng, pd.Series(_sentences(rng, nrows, 5)), 0.7),
+            "created": _with_nulls(rng, pd.Series(dates.strftime("%Y-%m-%d")), 0.3),
+        })
+
+    raise ValueError(f"Unknown shape {shape!r}; expected one of {SHAPES}")
+
+
+def generate_csv(path: str, shape: str, size_mb: float, seed: int = 0) -> str:
+    """Write a CSV of roughly ``size_mb`` megabytes (never smaller) to ``path``."""
+    target = int(size_mb * 1024 * 1024)
+    rng = np.random.default_rng(seed)
+    tmp_path = f"{path}.tmp"
+
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        rows = 0
+        while True:
+            # Start with a small probe chunk, then size chunks from the observed bytes/row
+            # so small files stay close to target.
+            nrows = PROBE_ROWS
+            if rows:
+                remaining = target - f.tell()
+                nrows = max(1, min(CHUNK_ROWS, int(remaining / (f.tell() / rows)) + 1))
+            _chunk(shape, rng, rows, nrows).to_csv(f, header=rows == 0, index=False)
+            rows += nrows
+            if f.tell() >= target:
+                break
+
+    os.replace(tmp_path, path)
+    return path
+
+
+def ensure_dataset(data_dir: str, shape: str, size_mb: float, seed: int = 0) -> str:
+    """Return the path of a cached dataset, generating it on first use."""
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f"{shape}_{size_mb:g}mb_seed{seed}.csv")
+    if not os.path.exists(path):
+        generate_csv(path, shape, size_mb, seed)
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shape", choices=SHAPES, required=True)
+    parser.add_argument("--size-mb", type=float, required=True)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", required=True)
+    args = parser.parse_args()
+    generate_csv(args.out, args.shape, args.size_mb, args.seed)
+    print(f"Wrote {os.path.getsize(args.out) / (1024 * 1024):.1f} MB to {args.out}")
@@ -0,0 +1,78 @@
+import itertools
+import json
+import os
+
+from csv_schema import read_csv, to_json_columns
+from routers import analytics
+
+_upload_ids = itertools.count()
+
+
+def test_upload_throughput(client, auth, dataset, profiled, benchmark):
+    size_mb = os.path.getsize(dataset) / (1024 * 1024)
+    uploaded = []
+
+    def upload():
+        with open(dataset, "rb") as f:
+            name = f"upload-{next(_upload_ids)}.csv"
+            response = client.post("/upload", files={"file": (name, f)}, headers=auth["headers"])
+        assert response.status_code == 200
+        uploaded.append(response.json()["id"])
+
+    def delete_uploads():
+        # Each round stores a full copy of the dataset (plus its snapshot); drop it before the next one.
+        while uploaded:
+            client.delete(f"/files/{uploaded.pop()}", headers=auth["headers"])
+
+    try:
+        profiled(upload, setup=delete_uploads)
+    finally:
+        delete_uploads()
+    benchmark.extra_info["file_mb"] = round(size_mb, 2)
+    # No stats under --benchmark-disable
+    if benchmark.stats is not None:
+        benchmark.extra_info["mb_per_s"] = round(size_mb / benchmark.stats.stats.mean, 2)
+
+
+def _clear_stats_cache():
+    analytics._stats_cache._entries.clear()
+
+
+def test_get_analytics(client, auth, registered_file, profiled):
+    def get_analytics():
+        response = client.get(f"/analytics/{registered_file}", headers=auth["headers"])
+        assert response.status_code == 200
+
+    profiled(get_analytics, setup=_clear_stats_cache)
+
+
+def test_get_analytics_projected_filtered(client, auth, dataset, registered_file, dataset_schema, profiled):
+    """Two columns of the rows in the top half of ``id``: exercises projection and row-group pruning."""
+    first_column = dataset_schema["columns"][1]["name"]
+    # Threshold from the data so every shape and size keeps the same ~50% of rows.
+    median_id = int(read_csv(dataset, dataset_schema, usecols=["id"])["id"].median())
+    params = [("columns", "id"), ("columns", first_column), ("filter", f"id:gte:{median_id}")]
+
+    def get_analytics():
+        response = client.get(f"/analytics/{registered_file}", params=params, headers=auth["headers"])
+        assert response.status_code == 200
+
+    profiled(get_analytics, setup=_clear_stats_cache)
+
+
+def test_get_file_data(client, auth, registered_file, profiled):
+    def get_file_data():
+        response = client.get(f"/analytics/{registered_file}/data", headers=auth["headers"])
+        assert response.status_code == 200
+
+    profiled(get_file_data)
+
+
+def test_file_data_serialization(dataset, dataset_schema, profiled):
+    """Isolates the conversion to JSON-ready columns and the JSON encoding done by ``get_file_data``."""
+    df = read_csv(dataset, dataset_schema, nrows=5000)
+
+    def serialize():
+        json.dumps(to_json_columns(df))
+
+    profiled(serialize)
@@ -0,0 +1,44 @@
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeMessagesListChatModel
+from langchain_core.messages import AIMessage
+
+import chat_agent
+
+
+class StubChatModel(FakeMessagesListChatModel):
+    """Stands in for ``ChatOpenAI``: one pandas tool call, then a final answer."""
+
+    def __init__(self, model=None, temperature=0, **kwargs):
+        super().__init__(responses=[
+            AIMessage(content="", additional_kwargs={
+                "function_call": {"name": "python_repl_ast", "arguments": '{"query": "df.describe()"}'},
+            }),
+            AIMessage(content="The dataset summary is above."),
+        ])
+
+
+@pytest.fixture(autouse=True)
+def stub_llm(monkeypatch):
+    monkeypatch.setenv("OPENAI_MODEL", "stub")
+    monkeypatch.setattr("langchain_openai.ChatOpenAI", StubChatModel)
+
+
+def _chat(client, auth, file_id):
+    response = client.post(
+        f"/analytics/{file_id}/chat",
+        json={"message": "Summarize the numeric columns"},
+        headers=auth["headers"],
+    )
+    assert response.status_code == 200, response.text
+
+
+def test_chat_cold_agent(client, auth, registered_file, profiled):
+    """Every round rebuilds the agent (cache miss)."""
+    profiled(
+        lambda: _chat(client, auth, registered_file),
+        setup=lambda: chat_agent._df_agent_manager._sessions.clear(),
+    )
+
+
+def test_chat_cached_agent(client, auth, registered_file, profiled):
+    profiled(lambda: _chat(client, auth, registered_file))
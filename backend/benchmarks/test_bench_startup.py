@@ -0,0 +1,36 @@
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _import_app():
+    """Import ``main`` in a fresh interpreter and return its ``-X importtime`` log."""
+    env = dict(os.environ, DATABASE_URL="sqlite://")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    return result.stderr
+
+
+def _parse_importtime(log):
+    """Yield ``(module, self_us, cumulative_us)`` from ``-X importtime`` output."""
+    for line in log.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        yield module.strip(), int(self_us), int(cumulative_us)
+
+
+def test_cold_import(benchmark):
+    log = benchmark.pedantic(_import_app, rounds=5, iterations=1)
+
+    modules = list(_parse_importtime(log))
+    imported = {name for name, _, _ in modules}
+    benchmark.extra_info["import_main_ms"] = next(cum for name, _, cum in modules if name == "main") / 1000
+    benchmark.extra_info["slowest_modules_ms"] = {
+        name: cum / 1000 for name, _, cum in sorted(modules, key=lambda m: m[2], reverse=True)[:10]
+    }
+    benchmark.extra_info["pandas_imported"] = "pandas" in imported
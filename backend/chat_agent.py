@@ -2,9 +2,12 @@ import os
 import threading
 import time
 from dataclasses import dataclass
-from typing import Dict, Tuple, Any
+from typing import TYPE_CHECKING, Dict, Tuple, Any
 
-import pandas as pd
+from metrics import AGENT_CACHE_LOOKUPS, LLM_TOKENS, observe_stage, span
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 
 DF_AGENT_SYSTEM_PROMPT = (
@@ -44,7 +47,7 @@ class DataFrameAgentManager:
         self._lock = threading.Lock()
         self._sessions: Dict[Tuple[str, str], _CachedSession] = {}
 
-    def get_agent(self, *, user_id: str, file_id: str, df: pd.DataFrame) -> Any:
+    def get_agent(self, *, user_id: str, file_id: str, df: "pd.DataFrame") -> Any:
         now = time.time()
         key = (user_id, file_id)
 
@@ -52,7 +55,9 @@ class DataFrameAgentManager:
             session = self._sessions.get(key)
             if session and session.expires_at > now:
                 session.last_used_at = now
+                AGENT_CACHE_LOOKUPS.labels(result="hit").inc()
                 return session.agent
+            AGENT_CACHE_LOOKUPS.labels(result="miss").inc()
 
             # cleanup expired first
             self._sessions = {k: v for k, v in self._sessions.items() if v.expires_at > now}
@@ -62,7 +67,8 @@ class DataFrameAgentManager:
                 lru_key = min(self._sessions.items(), key=lambda kv: kv[1].last_used_at)[0]
                 self._sessions.pop(lru_key, None)
 
-            agent = _build_pandas_df_agent(df)
+            with span("agent_build"):
+                agent = _build_pandas_df_agent(df)
             self._sessions[key] = _CachedSession(
                 agent=agent,
                 expires_at=now + self._ttl_seconds,
@@ -71,7 +77,7 @@ class DataFrameAgentManager:
             return agent
 
 
-def _build_pandas_df_agent(df: pd.DataFrame) -> Any:
+def _build_pandas_df_agent(df: "pd.DataFrame") -> Any:
     """Create a LangChain agent for Q&A over a pandas DataFrame."""
 
     # Imported lazily so importing the FastAPI app doesn't hard-fail
@@ -101,15 +107,62 @@ def _build_pandas_df_agent(df: pd.DataFrame) -> Any:
     return agent
 
 
+def _metrics_callback() -> Any:
+    """Build a LangChain callback handler that records LLM/tool time and token usage."""
+
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class _MetricsCallbackHandler(BaseCallbackHandler):
+        def __init__(self):
+            self._started: Dict[Any, float] = {}
+
+        def _start(self, run_id):
+            self._started[run_id] = time.perf_counter()
+
+        def _end(self, stage, run_id):
+            started = self._started.pop(run_id, None)
+            if started is not None:
+                observe_stage(stage, time.perf_counter() - started)
+
+        def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+            self._start(run_id)
+
+        def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+            self._start(run_id)
+
+        def on_llm_end(self, response, *, run_id, **kwargs):
+            self._end("llm", run_id)
+            usage = (response.llm_output or {}).get("token_usage") or {}
+            LLM_TOKENS.labels(kind="prompt").inc(usage.get("prompt_tokens") or 0)
+            LLM_TOKENS.labels(kind="completion").inc(usage.get("completion_tokens") or 0)
+
+        def on_llm_error(self, error, *, run_id, **kwargs):
+            self._end("llm", run_id)
+
+        def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+            self._start(run_id)
+
+        def on_tool_end(self, output, *, run_id, **kwargs):
+            self._end("tool", run_id)
+
+        def on_tool_error(self, error, *, run_id, **kwargs):
+            self._end("tool", run_id)
+
+    return _MetricsCallbackHandler()
+
+
 def invoke_agent(agent: Any, message: str) -> str:
     """Invoke an agent and normalize the output to a plain string."""
 
+    config = {"callbacks": [_metrics_callback()]}
+
     # Newer LangChain uses dict inputs/outputs; some allow string input.
     result: Any
-    try:
-        result = agent.invoke({"input": message})
-    except TypeError:
-        result = agent.invoke(message)
+    with span("agent_invoke"):
+        try:
+            result = agent.invoke({"input": message}, config=config)
+        except TypeError:
+            result = agent.invoke(message, config=config)
 
     if isinstance(result, str):
         return result
@@ -127,5 +180,5 @@ def invoke_agent(agent: Any, message: str) -> str:
 _df_agent_manager = DataFrameAgentManager()
 
 
-def get_dataframe_agent(*, user_id: str, file_id: str, df: pd.DataFrame) -> Any:
+def get_dataframe_agent(*, user_id: str, file_id: str, df: "pd.DataFrame") -> Any:
     return _df_agent_manager.get_agent(user_id=user_id, file_id=file_id, df=df)
@@ -0,0 +1,503 @@
+"""Per-file column schema, inferred once at upload and stored on ``FileDB``.
+
+The schema maps every column to a compact dtype so loaders don't fall back to
+pandas' default inference (``object`` strings, ``float64`` for ints with
+nulls):
+
+- integers -> ``int32``/``int64``, or ``Int32``/``Int64`` when nulls are present
+- low-cardinality strings -> ``category``
+- ISO-8601 dates -> parsed as datetimes
+- other strings -> ``string[pyarrow]``
+
+It also records the DataFrame memory footprint under default inference and
+under the schema, and writes a Parquet snapshot of the typed data next to the
+CSV. :func:`load_frame` reads that snapshot with column projection and
+predicate pushdown, so only the requested columns and the row groups whose
+statistics can match a filter are decoded.
+"""
+import os
+import re
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from metrics import span
+
+SCHEMA_VERSION = 1
+
+CATEGORY_MAX_UNIQUE = int(os.getenv("SCHEMA_CATEGORY_MAX_UNIQUE", "1000"))
+# A string column only becomes a category if distinct values are at most this share of non-null rows.
+CATEGORY_MAX_RATIO = 0.5
+INFER_CHUNK_ROWS = 100_000
+
+DATETIME = "datetime"
+BOOL_STRINGS = {"True", "False", "true", "false", "TRUE", "FALSE"}
+_DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}")
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as pa_dataset
+    import pyarrow.parquet as pq
+
+    STRING_DTYPE = "string[pyarrow]"
+except ImportError:
+    pa = None
+    STRING_DTYPE = "string"
+
+SNAPSHOT_SUFFIX = ".parquet"
+
+# Filter syntax: "<column>:<op>[:<value>]", e.g. "age:gte:30" or "email:is_null".
+FILTER_OPS = ("eq", "ne", "lt", "lte", "gt", "gte", "is_null", "not_null")
+_NULL_OPS = ("is_null", "not_null")
+_FILTER_RE = re.compile(r"^(?P<column>.+?):(?P<op>%s)(?::(?P<value>.*))?$" % "|".join(FILTER_OPS))
+
+_INT32 = np.iinfo(np.int32)
+_INT64 = np.iinfo(np.int64)
+
+
+class _ColumnProfile:
+    """Running summary of one column across the chunks of a CSV."""
+
+    def __init__(self):
+        self.kinds = set()
+        self.has_nulls = False
+        self.non_null = 0
+        self.integral = True
+        self.min = None
+        self.max = None
+        self.uniques = set()
+        self.dates = True
+        self.date_tz = None
+
+    def update(self, s: pd.Series):
+        self.has_nulls = self.has_nulls or bool(s.isna().any())
+        values = s.dropna()
+        self.non_null += len(values)
+
+        if pd.api.types.is_bool_dtype(s):
+            self.kinds.add("bool")
+        elif pd.api.types.is_integer_dtype(s) and s.dtype.kind == "i":
+            self.kinds.add("int")
+            self._update_range(values)
+        elif pd.api.types.is_float_dtype(s):
+            self.kinds.add("float")
+            if self.integral and len(values):
+                self.integral = bool((values % 1 == 0).all())
+                self._update_range(values)
+        elif pd.api.types.is_object_dtype(s) or pd.api.types.is_string_dtype(s):
+            self.kinds.add("str")
+            self._update_strings(values)
+        else:
+            self.kinds.add("other")
+
+    def _update_range(self, values: pd.Series):
+        if not len(values):
+            return
+        low, high = values.min(), values.max()
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+
+    def _update_strings(self, values: pd.Series):
+        if self.uniques is not None:
+            self.uniques.update(values.unique())
+            if len(self.uniques) > CATEGORY_MAX_UNIQUE:
+                self.uniques = None
+
+        if self.dates and len(values):
+            text = values.astype(str)
+            if not text.str.match(_DATE_RE).all():
+                self.dates = False
+            else:
+                # Parse every value: one bad date anywhere would make the typed read fall back to strings.
+                try:
+                    parsed = pd.to_datetime(text, format="ISO8601", errors="coerce")
+                except ValueError:
+                    # errors="coerce" doesn't cover mixed UTC offsets (e.g. across a DST change)
+                    self.dates = False
+                    return
+                # One offset for the whole column, or the typed read falls back to strings.
+                tz = str(parsed.dt.tz)
+                self.dates = bool(parsed.notna().all()) and self.date_tz in (None, tz)
+                self.date_tz = tz
+
+    def dtype(self):
+        """Resolve the profile to a dtype string, or ``None`` to keep pandas' default."""
+        if not self.kinds or "other" in self.kinds:
+            return None
+
+        if self.kinds == {"bool"}:
+            return "boolean" if self.has_nulls else "bool"
+
+        if self.kinds <= {"int", "float"}:
+            # Integral floats beyond int64 (e.g. 1e30) can't be read as integers.
+            fits_int64 = self.non_null and _INT64.min <= self.min and self.max <= _INT64.max
+            if self.non_null and self.integral and fits_int64:
+                fits_int32 = _INT32.min <= self.min and self.max <= _INT32.max
+                width = "32" if fits_int32 else "64"
+                return f"Int{width}" if self.has_nulls else f"int{width}"
+            return "float64"
+
+        if self.kinds == {"str"} and self.non_null:
+            if self.uniques is not None and {str(v) for v in self.uniques} <= BOOL_STRINGS:
+                return "boolean"
+            if self.dates:
+                return DATETIME
+            if self.uniques is not None and len(self.uniques) <= CATEGORY_MAX_RATIO * self.non_null:
+                return "category"
+
+        return STRING_DTYPE
+
+
+def _pandas_dtype(column: dict):
+    if column["dtype"] == "category" and column.get("categories") is not None:
+        return pd.CategoricalDtype(column["categories"])
+    return column["dtype"]
+
+
+def read_csv_kwargs(schema: dict, usecols=None) -> dict:
+    """``pd.read_csv`` keyword arguments (``usecols``, ``dtype``, ``parse_dates``) for ``schema``."""
+    columns = schema["columns"]
+    if usecols is not None:
+        wanted = set(usecols)
+        columns = [c for c in columns if c["name"] in wanted]
+
+    kwargs = {
+        "usecols": [c["name"] for c in columns],
+        "dtype": {c["name"]: _pandas_dtype(c) for c in columns if c["dtype"] not in (None, DATETIME)},
+    }
+    parse_dates = [c["name"] for c in columns if c["dtype"] == DATETIME]
+    if parse_dates:
+        kwargs["parse_dates"] = parse_dates
+        kwargs["date_format"] = "ISO8601"
+    return kwargs
+
+
+def read_csv(filepath: str, schema=None, usecols=None, **kwargs) -> pd.DataFrame:
+    """Read a CSV with the dtypes from ``schema``; default inference if there is none."""
+    if schema is None:
+        return pd.read_csv(filepath, usecols=usecols, **kwargs)
+    return pd.read_csv(filepath, **read_csv_kwargs(schema, usecols), **kwargs)
+
+
+def infer_schema(filepath: str) -> dict:
+    """Scan ``filepath`` in chunks and return its column schema and memory report."""
+    # Seed from the header so columns survive even if the file has no rows.
+    profiles = {name: _ColumnProfile() for name in pd.read_csv(filepath, nrows=0).columns}
+    default_bytes = 0
+    for chunk in pd.read_csv(filepath, chunksize=INFER_CHUNK_ROWS):
+        default_bytes += int(chunk.memory_usage(deep=True).sum())
+        for name in chunk.columns:
+            try:
+                profiles[name].update(chunk[name])
+            except Exception as e:
+                # Keep pandas' default for this column rather than losing the whole schema.
+                print(f"Schema inference failed for column {name!r} of {filepath}: {e}")
+                profiles[name].kinds.add("other")
+
+    columns = []
+    for name, profile in profiles.items():
+        column = {"name": str(name), "dtype": profile.dtype()}
+        if column["dtype"] == "category":
+            # Fixed categories keep the dtype identical across chunks and loads.
+            column["categories"] = sorted(str(v) for v in profile.uniques)
+        columns.append(column)
+    schema = {"version": SCHEMA_VERSION, "columns": columns}
+
+    optimized_bytes, schema["snapshot"] = scan_with_schema(filepath, schema, write_snapshot=True)
+    schema["memory"] = {"default_bytes": default_bytes, "optimized_bytes": optimized_bytes}
+    return schema
+
+
+def snapshot_path(filepath: str) -> str:
+    return filepath + SNAPSHOT_SUFFIX
+
+
+def scan_with_schema(filepath: str, schema: dict, write_snapshot: bool = False) -> tuple:
+    """Read ``filepath`` in chunks with ``schema``.
+
+    Returns ``(optimized_bytes, snapshot_written)``, where ``optimized_bytes``
+    is the in-memory size of the typed chunks.
+
+    With ``write_snapshot`` (and pyarrow installed) the chunks are also written
+    to the Parquet snapshot, one row group per chunk. A failed snapshot is
+    discarded; loaders then fall back to the CSV.
+    """
+    writer = None
+    optimized_bytes = 0
+    write_snapshot = write_snapshot and pa is not None
+    tmp_path = None
+    if write_snapshot:
+        # A unique temp file per writer: concurrent first requests for the same
+        # file each write their own and the last os.replace wins.
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(filepath) or ".", prefix=f"{os.path.basename(filepath)}.", suffix=".tmp"
+        )
+        os.close(fd)
+
+    written = False
+    try:
+        try:
+            for chunk in pd.read_csv(filepath, chunksize=INFER_CHUNK_ROWS, **read_csv_kwargs(schema)):
+                optimized_bytes += int(chunk.memory_usage(deep=True).sum())
+                if not write_snapshot:
+                    continue
+                try:
+                    table = pa.Table.from_pandas(chunk, preserve_index=False)
+                    if writer is None:
+                        writer = pq.ParquetWriter(tmp_path, _widen_dictionaries(table.schema))
+                    writer.write_table(table.cast(writer.schema))
+                except Exception as e:
+                    print(f"Snapshot write failed for {filepath}: {e}")
+                    write_snapshot = False
+        finally:
+            if writer is not None:
+                writer.close()
+
+        written = write_snapshot and writer is not None
+        if written:
+            os.replace(tmp_path, snapshot_path(filepath))
+    finally:
+        if tmp_path is not None and not written and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return optimized_bytes, written
+
+
+def _widen_dictionaries(arrow_schema):
+    # pandas picks the smallest index type per chunk; use int32 everywhere so
+    # every chunk casts to the same schema.
+    fields = [
+        field.with_type(pa.dictionary(pa.int32(), field.type.value_type))
+        if pa.types.is_dictionary(field.type) else field
+        for field in arrow_schema
+    ]
+    return pa.schema(fields, metadata=arrow_schema.metadata)
+
+
+def _coerce_filter_value(column: dict, value: str):
+    dtype = column["dtype"] or ""
+    if dtype.lower().startswith("int"):
+        # Parse as int first: going through float loses precision above 2**53.
+        try:
+            number = int(value)
+        except ValueError:
+            number = float(value)
+            number = int(number) if number.is_integer() else number
+        # Neither pyarrow nor pandas can compare an int64 column with an out-of-range value.
+        if not _INT64.min <= number <= _INT64.max:
+            raise ValueError(f"{value!r} is out of range for an integer column")
+        return number
+    if dtype == "float64":
+        return float(value)
+    if dtype in ("bool", "boolean"):
+        if value.lower() not in ("true", "false"):
+            raise ValueError(f"expected true or false, got {value!r}")
+        return value.lower() == "true"
+    if dtype == DATETIME:
+        return pd.Timestamp(value)
+    return value
+
+
+def parse_filters(expressions, schema: dict) -> tuple:
+    """Parse ``"<column>:<op>[:<value>]"`` strings into ``(column, op, value)`` tuples.
+
+    Values are converted to the column's type. Raises ``ValueError`` with a
+    user-facing message for unknown columns, operators or bad values.
+    """
+    if not expressions:
+        return ()
+    if schema is None:
+        raise ValueError("Filters need the file's column schema")
+
+    columns = {c["name"]: c for c in schema["columns"]}
+    filters = []
+    for expression in expressions:
+        match = _FILTER_RE.match(expression)
+        if not match:
+            raise ValueError(
+                f"Invalid filter {expression!r}; expected <column>:<op>[:<value>] "
+                f"with op one of {', '.join(FILTER_OPS)}"
+            )
+        name, op, value = match.group("column"), match.group("op"), match.group("value")
+        if name not in columns:
+            raise ValueError(f"Unknown column {name!r} in filter")
+        if op in _NULL_OPS:
+            if value is not None:
+                raise ValueError(f"Filter {expression!r}: {op} takes no value")
+        else:
+            if value is None:
+                raise ValueError(f"Filter {expression!r}: {op} needs a value")
+            try:
+                value = _coerce_filter_value(columns[name], value)
+            except ValueError as e:
+                raise ValueError(f"Filter {expression!r}: invalid value for column {name!r} ({e})")
+        filters.append((name, op, value))
+    return tuple(filters)
+
+
+def _arrow_expression(filters):
+    expression = None
+    for name, op, value in filters:
+        field = pc.field(name)
+        if isinstance(value, pd.Timestamp):
+            value = value.to_pydatetime()
+        condition = {
+            "eq": lambda: field == value,
+            "ne": lambda: field != value,
+            "lt": lambda: field < value,
+            "lte": lambda: field <= value,
+            "gt": lambda: field > value,
+            "gte": lambda: field >= value,
+            "is_null": lambda: field.is_null(),
+            "not_null": lambda: field.is_valid(),
+        }[op]()
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def _pandas_mask(df: pd.DataFrame, filters) -> pd.Series:
+    mask = pd.Series(True, index=df.index)
+    for name, op, value in filters:
+        col = df[name]
+        if op == "is_null":
+            condition = col.isna()
+        elif op == "not_null":
+            condition = col.notna()
+        else:
+            if isinstance(col.dtype, pd.CategoricalDtype):
+                # Unordered categoricals only support ==/!=; compare as strings like the Parquet path does.
+                col = col.astype(STRING_DTYPE)
+            condition = {
+                "eq": col.__eq__,
+                "ne": col.__ne__,
+                "lt": col.__lt__,
+                "lte": col.__le__,
+                "gt": col.__gt__,
+                "gte": col.__ge__,
+            }[op](value)
+            # Comparisons never match missing values (as in SQL and Arrow).
+            condition = condition.fillna(False).astype(bool) & col.notna()
+        mask &= condition
+    return mask
+
+
+def select_columns(schema, columns):
+    """Validate a column projection and return it in file order (``None`` means all columns)."""
+    if not columns:
+        return None
+    if schema is None:
+        raise ValueError("Column selection needs the file's column schema")
+    names = [c["name"] for c in schema["columns"]]
+    unknown = [c for c in columns if c not in names]
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+    wanted = set(columns)
+    return [n for n in names if n in wanted]
+
+
+def load_frame(filepath: str, schema, columns=None, filters=(), nrows=None) -> pd.DataFrame:
+    """Load ``columns`` (default: all) of the rows matching ``filters``, at most ``nrows`` of them.
+
+    Reads the Parquet snapshot when there is one, pushing the projection and
+    filters down to the scanner; otherwise reads only the needed CSV columns
+    in chunks and filters each chunk.
+    """
+    projection = select_columns(schema, columns)
+    if schema is None:
+        if filters:
+            raise ValueError("Filters need the file's column schema")
+        return read_csv(filepath, nrows=nrows)
+
+    if projection is None:
+        projection = [c["name"] for c in schema["columns"]]
+    needed = projection + [n for n in dict.fromkeys(f[0] for f in filters) if n not in projection]
+
+    path = snapshot_path(filepath)
+    if pa is not None and os.path.exists(path):
+        try:
+            dataset = pa_dataset.dataset(path, format="parquet")
+            expression = _arrow_expression(filters)
+            if nrows is None:
+                table = dataset.to_table(columns=needed, filter=expression)
+            else:
+                table = dataset.head(nrows, columns=needed, filter=expression)
+            return table.to_pandas()[projection]
+        except (pa.ArrowException, OSError) as e:
+            # The CSV is the source of truth; an unreadable snapshot only costs speed.
+            print(f"Snapshot read failed for {filepath}, reading the CSV instead: {e}")
+
+    if not filters:
+        return read_csv(filepath, schema, usecols=needed, nrows=nrows)
+
+    parts = []
+    remaining = nrows
+    for chunk in read_csv(filepath, schema, usecols=needed, chunksize=INFER_CHUNK_ROWS):
+        chunk = chunk[_pandas_mask(chunk, filters)]
+        if remaining is not None:
+            chunk = chunk.iloc[:remaining]
+            remaining -= len(chunk)
+        parts.append(chunk)
+        if remaining == 0:
+            break
+    df = pd.concat(parts, ignore_index=True) if parts else read_csv(filepath, schema, usecols=needed, nrows=0)
+    return df[projection]
+
+
+def to_json_columns(df: pd.DataFrame) -> dict:
+    """Column-oriented, JSON-ready values: missing values become ``None`` and datetimes ISO strings."""
+    data = {}
+    for name in df.columns:
+        col = df[name]
+        if pd.api.types.is_datetime64_any_dtype(col):
+            values = col.dropna()
+            date_only = col.dt.tz is None and bool((values == values.dt.normalize()).all())
+            if date_only:
+                col = col.dt.strftime("%Y-%m-%d")
+            else:
+                # isoformat keeps fractional seconds and the UTC offset, which strftime patterns drop.
+                col = col.map(lambda v: v.isoformat(), na_action="ignore")
+        data[name] = col.astype(object).where(col.notna(), None).tolist()
+    return data
+
+
+def infer_schema_or_failure(filepath: str) -> dict:
+    """Like :func:`infer_schema`, but returns a failure marker if the CSV can't be parsed.
+
+    Unparseable files are still accepted at upload; the marker is stored in
+    place of the schema so inference isn't retried on every request, and the
+    analytics endpoints report the read error when the file is opened.
+    """
+    try:
+        with span("schema_inference"):
+            return infer_schema(filepath)
+    except Exception as e:
+        print(f"Schema inference failed for {filepath}: {e}")
+        return {"version": SCHEMA_VERSION, "error": str(e)}
+
+
+def schema_error(column_schema):
+    """The inference error recorded in a stored schema, or ``None``."""
+    return column_schema.get("error") if column_schema is not None else None
+
+
+def ensure_schema(db, db_file):
+    """Return ``db_file``'s schema, inferring and saving it for files uploaded before schemas existed.
+
+    Returns ``None`` when the CSV can't be parsed; the failure is stored so
+    it's only attempted once. Schemas stored before snapshots existed get
+    their Parquet snapshot written once here, with the outcome recorded the
+    same way.
+    """
+    if db_file.column_schema is None:
+        db_file.column_schema = infer_schema_or_failure(db_file.filepath)
+        db.commit()
+    elif schema_error(db_file.column_schema) is None and "snapshot" not in db_file.column_schema and pa is not None:
+        with span("snapshot_write"):
+            _, written = scan_with_schema(db_file.filepath, db_file.column_schema, write_snapshot=True)
+        # Reassign: the JSON column doesn't track in-place mutation.
+        db_file.column_schema = {**db_file.column_schema, "snapshot": written}
+        db.commit()
+    if schema_error(db_file.column_schema) is not None:
+        return None
+    return db_file.column_schema
@@ -1,7 +1,9 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker, declarative_base
 import os
 
+from metrics import instrument_engine
+
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://user:password@db:5432/analytics_db")
 
 engine_args = {}
@@ -9,6 +11,7 @@ if DATABASE_URL.startswith("sqlite"):
     engine_args["connect_args"] = {"check_same_thread": False}
 
 engine = create_engine(DATABASE_URL, **engine_args)
+instrument_engine(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -19,3 +22,27 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def add_missing_columns(bind):
+    """Add nullable columns that exist on the models but not yet in the database.
+
+    ``create_all`` only creates missing tables, so tables created by an older
+    version of the app would otherwise never pick up new columns.
+    """
+    inspector = inspect(bind)
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=bind.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+
+
+def init_db():
+    Base.metadata.create_all(bind=engine)
+    add_missing_columns(engine)
@@ -1,30 +1,61 @@
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI, Depends, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
-import time
+import asyncio
 from sqlalchemy.exc import OperationalError
 
-from database import engine, Base
+from database import init_db
 from routers import auth, files, analytics
 from schemas import User
 from auth import get_current_user
+from metrics import PrometheusMiddleware, render_latest
 
+DB_INIT_RETRY_DELAY = 2
+DB_INIT_MAX_RETRY_DELAY = 30
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    # Create tables with retry
-    max_retries = 5
-    retry_delay = 2
-    for i in range(max_retries):
+
+async def init_database(app: FastAPI):
+    # Create tables, retrying with backoff until the database accepts
+    # connections. Runs in the background so the worker starts accepting
+    # connections (and answering /healthz) immediately; /readyz reports 503
+    # until this succeeds. Any other error won't go away by waiting, so it
+    # fails /healthz instead and the worker gets restarted.
+    delay = DB_INIT_RETRY_DELAY
+    while True:
         try:
-            Base.metadata.create_all(bind=engine)
-            break
+            await run_in_threadpool(init_db)
         except OperationalError as e:
-            if i == max_retries - 1:
-                raise e
-            print(f"Database not ready, retrying in {retry_delay} seconds...")
-            time.sleep(retry_delay)
+            print(f"Database not ready ({e}), retrying in {delay} seconds...")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, DB_INIT_MAX_RETRY_DELAY)
+        except Exception as e:
+            print(f"Database initialization failed: {e}")
+            app.state.db_init_failed = True
+            return
+        else:
+            app.state.db_ready = True
+            return
+
+
+async def warm_data_stack(app: FastAPI):
+    await run_in_threadpool(analytics.warm_data_stack)
+    app.state.data_stack_ready = True
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.db_ready = False
+    app.state.db_init_failed = False
+    app.state.data_stack_ready = False
+    tasks = [
+        asyncio.create_task(init_database(app)),
+        asyncio.create_task(warm_data_stack(app)),
+    ]
     yield
+    for task in tasks:
+        task.cancel()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -41,6 +72,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(PrometheusMiddleware)
 
 app.include_router(auth.router)
 app.include_router(files.router)
@@ -50,3 +82,27 @@ app.include_router(analytics.router)
 @app.get("/", response_model=dict)
 def read_root(current_user: User = Depends(get_current_user)):
     return {"message": "Welcome to the protected API!", "user": current_user.username}
+
+
+@app.get("/healthz", include_in_schema=False)
+def liveness(request: Request):
+    if getattr(request.app.state, "db_init_failed", False):
+        return JSONResponse(content={"status": "failed", "database": False}, status_code=503)
+    return {"status": "ok"}
+
+
+@app.get("/readyz", include_in_schema=False)
+def readiness(request: Request):
+    db_ready = getattr(request.app.state, "db_ready", False)
+    body = {
+        "status": "ready" if db_ready else "starting",
+        "database": db_ready,
+        "data_stack": getattr(request.app.state, "data_stack_ready", False),
+    }
+    return JSONResponse(content=body, status_code=200 if db_ready else 503)
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    body, content_type = render_latest()
+    return Response(content=body, media_type=content_type)
@@ -0,0 +1,234 @@
+"""Prometheus metrics and timing spans for the backend.
+
+Metrics are served from ``/metrics`` (see ``main.py``). OpenTelemetry tracing is
+optional: set ``OTEL_TRACES_FILE`` to a path and every finished span is appended
+to it as one JSON document per line.
+"""
+import contextvars
+import logging
+import os
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+)
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Seconds. Covers fast JSON endpoints up to slow LLM round trips.
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0,
+)
+
+# Upper bounds (bytes) for the ``size_bucket`` label, smallest first.
+FILE_SIZE_BUCKETS = (
+    (1 << 20, "lt_1mb"),
+    (10 << 20, "1mb_10mb"),
+    (100 << 20, "10mb_100mb"),
+    (1 << 30, "100mb_1gb"),
+)
+NO_FILE = "none"
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template.",
+    ["method", "route", "status", "size_bucket"],
+    buckets=LATENCY_BUCKETS,
+)
+STAGE_LATENCY = Histogram(
+    "stage_duration_seconds",
+    "Latency of an instrumented stage (CSV parse, stats, serialization, LLM, ...).",
+    ["stage", "size_bucket"],
+    buckets=LATENCY_BUCKETS,
+)
+DB_QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds",
+    "Database statement latency by statement type.",
+    ["statement"],
+    buckets=LATENCY_BUCKETS,
+)
+AGENT_CACHE_LOOKUPS = Counter(
+    "agent_cache_lookups_total",
+    "DataFrame agent cache lookups.",
+    ["result"],
+)
+STATS_CACHE_LOOKUPS = Counter(
+    "stats_cache_lookups_total",
+    "Column statistics cache lookups.",
+    ["result"],
+)
+LLM_TOKENS = Counter(
+    "llm_tokens_total",
+    "Tokens reported by the LLM provider.",
+    ["kind"],
+)
+
+# Per-request mutable labels. The middleware installs a fresh dict; handlers
+# running in the threadpool see the same object through the copied context.
+_request_labels: contextvars.ContextVar[Optional[Dict[str, str]]] = contextvars.ContextVar(
+    "request_labels", default=None
+)
+
+
+def _init_tracer() -> Any:
+    path = os.getenv("OTEL_TRACES_FILE")
+    if not path:
+        return None
+
+    # Imported lazily so the SDK stays an optional dependency.
+    try:
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+    except ImportError:
+        logger.warning("OTEL_TRACES_FILE is set but opentelemetry-sdk is not installed; tracing disabled")
+        return None
+
+    provider = TracerProvider(resource=Resource.create({"service.name": "analytics-backend"}))
+    exporter = ConsoleSpanExporter(
+        out=open(path, "a", encoding="utf-8"),
+        formatter=lambda span: span.to_json(indent=None) + "\n",
+    )
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    return provider.get_tracer(__name__)
+
+
+_tracer = _init_tracer()
+
+
+def file_size_bucket(nbytes: int) -> str:
+    for limit, label in FILE_SIZE_BUCKETS:
+        if nbytes < limit:
+            return label
+    return "gte_1gb"
+
+
+def record_file_size(path: str) -> str:
+    """Tag the current request with the size bucket of ``path`` and return it."""
+    try:
+        bucket = file_size_bucket(os.path.getsize(path))
+    except OSError:
+        bucket = NO_FILE
+    labels = _request_labels.get()
+    if labels is not None:
+        labels["size_bucket"] = bucket
+    return bucket
+
+
+def current_size_bucket() -> str:
+    labels = _request_labels.get()
+    if labels is None:
+        return NO_FILE
+    return labels.get("size_bucket", NO_FILE)
+
+
+@contextmanager
+def span(stage: str, **attributes: Any):
+    """Time a block into ``stage_duration_seconds`` and, if enabled, an OTel span."""
+    bucket = current_size_bucket()
+    start = time.perf_counter()
+    otel_cm = _tracer.start_as_current_span(stage) if _tracer is not None else nullcontext()
+    with otel_cm as otel_span:
+        if otel_span is not None:
+            otel_span.set_attribute("size_bucket", bucket)
+            for key, value in attributes.items():
+                otel_span.set_attribute(key, value)
+        try:
+            yield
+        finally:
+            STAGE_LATENCY.labels(stage=stage, size_bucket=bucket).observe(time.perf_counter() - start)
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    """Record a stage duration measured elsewhere (e.g. from LangChain callbacks)."""
+    STAGE_LATENCY.labels(stage=stage, size_bucket=current_size_bucket()).observe(seconds)
+
+
+class PrometheusMiddleware:
+    """ASGI middleware recording per-route request latency.
+
+    The route label is the path template (``/analytics/{file_id}``), not the raw
+    path, so label cardinality stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] == "/metrics":
+            await self.app(scope, receive, send)
+            return
+
+        labels: Dict[str, str] = {}
+        route: Optional[str] = None
+        token = _request_labels.set(labels)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            # The route is only resolved once the router has run, so the span
+            # starts as just the method and is renamed to the template afterwards.
+            otel_cm = _tracer.start_as_current_span(scope["method"]) if _tracer is not None else nullcontext()
+            with otel_cm as otel_span:
+                try:
+                    await self.app(scope, receive, send_wrapper)
+                finally:
+                    route = getattr(scope.get("route"), "path", None)
+                    if otel_span is not None and route is not None:
+                        otel_span.update_name(f'{scope["method"]} {route}')
+                        otel_span.set_attribute("http.route", route)
+        finally:
+            REQUEST_LATENCY.labels(
+                method=scope["method"],
+                route=route or "unmatched",
+                status=str(status["code"]),
+                size_bucket=labels.get("size_bucket", NO_FILE),
+            ).observe(time.perf_counter() - start)
+            _request_labels.reset(token)
+
+
+def instrument_engine(engine) -> None:
+    """Attach query timing listeners to a SQLAlchemy engine."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_start"].pop()
+        kind = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "UNKNOWN"
+        DB_QUERY_LATENCY.labels(statement=kind).observe(time.perf_counter() - started)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        conn = context.connection
+        if conn is not None and conn.info.get("query_start"):
+            conn.info["query_start"].pop()
+
+
+def render_latest() -> tuple:
+    """Return ``(body, content_type)`` for the ``/metrics`` endpoint.
+
+    Honours ``PROMETHEUS_MULTIPROC_DIR`` so ``uvicorn --workers N`` exports the
+    aggregate of all workers rather than whichever one answered the scrape.
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
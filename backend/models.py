@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Boolean, ForeignKey, DateTime
+from sqlalchemy import Column, String, Boolean, ForeignKey, DateTime, JSON
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -23,5 +23,7 @@ class FileDB(Base):
     filepath = Column(String)
     upload_date = Column(DateTime(timezone=True), server_default=func.now())
     owner_id = Column(String, ForeignKey("users.id"))
+    # Column dtypes inferred at upload (see csv_schema.py)
+    column_schema = Column(JSON, nullable=True)
 
     owner = relationship("UserDB", back_populates="files")
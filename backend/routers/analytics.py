@@ -1,39 +1,117 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
-import pandas as pd
+from collections import OrderedDict
+from typing import List, Optional
 import os
-import numpy as np
+import threading
 
 from database import get_db
 from models import UserDB, FileDB
 from auth import get_current_user
 from schemas import ChatRequest, ChatResponse
 from chat_agent import get_dataframe_agent, invoke_agent
+from metrics import STATS_CACHE_LOOKUPS, record_file_size, span
 
 router = APIRouter()
 
 
 CHAT_MAX_ROWS = int(os.getenv("CHAT_MAX_ROWS", "5000"))
+DATA_MAX_ROWS = 5000
+STATS_CACHE_SIZE = int(os.getenv("STATS_CACHE_SIZE", "256"))
 
+COLUMNS_QUERY = Query(None, description="Only return these columns (repeat the parameter for several).")
+FILTER_QUERY = Query(
+    None,
+    alias="filter",
+    description="Row filter <column>:<op>[:<value>], op one of eq, ne, lt, lte, gt, gte, is_null, not_null. "
+    "Repeat the parameter to AND several filters.",
+)
 
-@router.get("/analytics/{file_id}")
-def get_analytics(
-    file_id: str,
-    current_user: UserDB = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    db_file = db.query(FileDB).filter(FileDB.id == file_id, FileDB.owner_id == current_user.id).first()
-    if not db_file:
-        raise HTTPException(status_code=404, detail="File not found")
 
-    if not os.path.exists(db_file.filepath):
-        raise HTTPException(status_code=404, detail="File not found on disk")
+class StatsCache:
+    """LRU cache of column statistics keyed by (file id, file version, projection, predicate).
+
+    The file version is the CSV's mtime and size, so a replaced file never
+    serves stale stats. Like the agent cache, this is per worker.
+    """
+
+    def __init__(self, *, max_entries: int = 256):
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: OrderedDict = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                STATS_CACHE_LOOKUPS.labels(result="miss").inc()
+                return None
+            self._entries.move_to_end(key)
+            STATS_CACHE_LOOKUPS.labels(result="hit").inc()
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+
+_stats_cache = StatsCache(max_entries=STATS_CACHE_SIZE)
+
+
+def warm_data_stack():
+    """Import pandas/numpy (via csv_schema) ahead of the first analytics request.
+
+    The endpoints import them lazily so importing the app (and answering
+    /token, /files, health checks) doesn't wait on the data stack.
+    """
+    import csv_schema  # noqa: F401
+
+
+def _file_version(filepath: str) -> tuple:
+    stat = os.stat(filepath)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _load_schema(db: Session, db_file: FileDB):
+    from csv_schema import ensure_schema
 
     try:
-        df = pd.read_csv(db_file.filepath)
+        return ensure_schema(db, db_file)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error reading CSV file: {str(e)}")
 
+
+def _parse_selection(db_file: FileDB, schema, columns, filters):
+    """Validate the ``columns``/``filter`` query parameters against the file's schema."""
+    from csv_schema import parse_filters, schema_error, select_columns
+
+    if schema is None and (columns or filters):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Column selection and filters are unavailable for this file: "
+            f"its schema could not be inferred ({schema_error(db_file.column_schema)})",
+        )
+    try:
+        return select_columns(schema, columns), parse_filters(filters, schema)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _float_or_none(value):
+    # Missing results (std of a single row, stats of an all-null column) are
+    # NaN or pd.NA, neither of which is valid JSON.
+    import pandas as pd
+
+    return None if pd.isna(value) else float(value)
+
+
+def _column_stats(df) -> list:
+    import pandas as pd
+
     analytics_data = []
 
     for col in df.columns:
@@ -41,36 +119,45 @@ def get_analytics(
         stats = {}
 
         # Determine simplified type
+        # bool is also a numeric dtype, so check it first
         simple_type = "String"
-        if pd.api.types.is_numeric_dtype(col_data):
+        if pd.api.types.is_bool_dtype(col_data):
+            simple_type = "Boolean"
+        elif pd.api.types.is_numeric_dtype(col_data):
             if pd.api.types.is_integer_dtype(col_data):
                 simple_type = "Integer"
             else:
                 simple_type = "Float"
-        elif pd.api.types.is_bool_dtype(col_data):
-            simple_type = "Boolean"
+        elif pd.api.types.is_datetime64_any_dtype(col_data):
+            simple_type = "Date"
 
         # Common stats
         stats["missing_values"] = int(col_data.isnull().sum())
         stats["total_count"] = int(len(col_data))
 
         if simple_type in ["Integer", "Float"]:
-            stats["mean"] = float(col_data.mean()) if not col_data.empty else None
-            stats["median"] = float(col_data.median()) if not col_data.empty else None
-            stats["min"] = float(col_data.min()) if not col_data.empty else None
-            stats["max"] = float(col_data.max()) if not col_data.empty else None
-            stats["std"] = float(col_data.std()) if not col_data.empty else None
+            stats["mean"] = _float_or_none(col_data.mean()) if not col_data.empty else None
+            stats["median"] = _float_or_none(col_data.median()) if not col_data.empty else None
+            stats["min"] = _float_or_none(col_data.min()) if not col_data.empty else None
+            stats["max"] = _float_or_none(col_data.max()) if not col_data.empty else None
+            stats["std"] = _float_or_none(col_data.std()) if not col_data.empty else None
 
             quantiles = col_data.quantile([0.25, 0.5, 0.75]).to_dict()
-            stats["25%"] = float(quantiles.get(0.25)) if not col_data.empty else None
-            stats["50%"] = float(quantiles.get(0.5)) if not col_data.empty else None
-            stats["75%"] = float(quantiles.get(0.75)) if not col_data.empty else None
+            stats["25%"] = _float_or_none(quantiles.get(0.25)) if not col_data.empty else None
+            stats["50%"] = _float_or_none(quantiles.get(0.5)) if not col_data.empty else None
+            stats["75%"] = _float_or_none(quantiles.get(0.75)) if not col_data.empty else None
 
         elif simple_type == "Boolean":
             value_counts = col_data.value_counts().to_dict()
             stats["true_count"] = int(value_counts.get(True, 0))
             stats["false_count"] = int(value_counts.get(False, 0))
 
+        elif simple_type == "Date":
+            stats["unique_count"] = int(col_data.nunique())
+            has_values = bool(col_data.notna().any())
+            stats["min"] = col_data.min().isoformat() if has_values else None
+            stats["max"] = col_data.max().isoformat() if has_values else None
+
         else:  # String / Object
             stats["unique_count"] = int(col_data.nunique())
             if not col_data.empty:
@@ -85,32 +172,81 @@ def get_analytics(
             "stats": stats
         })
 
+    return analytics_data
+
+
+@router.get("/analytics/{file_id}")
+def get_analytics(
+    file_id: str,
+    columns: Optional[List[str]] = COLUMNS_QUERY,
+    filters: Optional[List[str]] = FILTER_QUERY,
+    current_user: UserDB = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    from csv_schema import load_frame
+
+    db_file = db.query(FileDB).filter(FileDB.id == file_id, FileDB.owner_id == current_user.id).first()
+    if not db_file:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    if not os.path.exists(db_file.filepath):
+        raise HTTPException(status_code=404, detail="File not found on disk")
+    record_file_size(db_file.filepath)
+
+    schema = _load_schema(db, db_file)
+    projection, predicate = _parse_selection(db_file, schema, columns, filters)
+
+    cache_key = (file_id, _file_version(db_file.filepath), tuple(projection or ()), predicate)
+    analytics_data = _stats_cache.get(cache_key)
+    if analytics_data is None:
+        try:
+            with span("read_csv", endpoint="analytics"):
+                df = load_frame(db_file.filepath, schema, projection, predicate)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error reading CSV file: {str(e)}")
+
+        with span("stats", columns=len(df.columns)):
+            analytics_data = _column_stats(df)
+        _stats_cache.put(cache_key, analytics_data)
+
     return {"filename": db_file.filename, "columns": analytics_data}
 
 
 @router.get("/analytics/{file_id}/data")
 def get_file_data(
     file_id: str,
+    columns: Optional[List[str]] = COLUMNS_QUERY,
+    filters: Optional[List[str]] = FILTER_QUERY,
     current_user: UserDB = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
+    from csv_schema import load_frame, to_json_columns
+
     db_file = db.query(FileDB).filter(FileDB.id == file_id, FileDB.owner_id == current_user.id).first()
     if not db_file:
         raise HTTPException(status_code=404, detail="File not found")
 
     if not os.path.exists(db_file.filepath):
         raise HTTPException(status_code=404, detail="File not found on disk")
+    record_file_size(db_file.filepath)
+
+    schema = _load_schema(db, db_file)
+    projection, predicate = _parse_selection(db_file, schema, columns, filters)
 
     try:
-        # Read only first 5000 rows for performance
-        df = pd.read_csv(db_file.filepath, nrows=5000)
-        # Replace NaN with None for JSON compatibility
-        df = df.replace({np.nan: None})
-        data = df.to_dict(orient="list")
+        # Read only the first matching rows for performance
+        with span("read_csv", endpoint="data"):
+            df = load_frame(db_file.filepath, schema, projection, predicate, nrows=DATA_MAX_ROWS)
+        with span("to_dict"):
+            # Replace NaN/NA with None for JSON compatibility
+            data = to_json_columns(df)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error reading CSV file: {str(e)}")
 
-    return data
+    # Encode here rather than letting FastAPI do it so the cost shows up as its own span.
+    # to_json_columns already yields native Python values, so jsonable_encoder is not needed.
+    with span("json_encode"):
+        return JSONResponse(content=data)
 
 
 @router.post("/analytics/{file_id}/chat", response_model=ChatResponse)
@@ -120,16 +256,22 @@ def chat_with_dataset(
     current_user: UserDB = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
+    from csv_schema import load_frame
+
     db_file = db.query(FileDB).filter(FileDB.id == file_id, FileDB.owner_id == current_user.id).first()
     if not db_file:
         raise HTTPException(status_code=404, detail="File not found")
 
     if not os.path.exists(db_file.filepath):
         raise HTTPException(status_code=404, detail="File not found on disk")
+    record_file_size(db_file.filepath)
+
+    schema = _load_schema(db, db_file)
 
     try:
-        df = pd.read_csv(db_file.filepath, nrows=CHAT_MAX_ROWS)
-        df = df.replace({np.nan: None})
+        with span("read_csv", endpoint="chat"):
+            # Keep the schema dtypes (no NaN -> None replacement) so cached agent frames stay compact.
+            df = load_frame(db_file.filepath, schema, nrows=CHAT_MAX_ROWS)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error reading CSV file: {str(e)}")
 
@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import List
 import shutil
@@ -6,8 +7,9 @@ import os
 
 from database import get_db
 from models import UserDB, FileDB
-from schemas import FileResponse, FileUpdate
+from schemas import FileResponse, FileUpdate, FileSchemaResponse
 from auth import get_current_user
+from metrics import record_file_size
 
 router = APIRouter()
 
@@ -22,6 +24,9 @@ async def upload_file(
     current_user: UserDB = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
+    # Imported lazily: csv_schema pulls in pandas.
+    from csv_schema import infer_schema_or_failure
+
     if not file.filename.endswith('.csv'):
         raise HTTPException(status_code=400, detail="Only CSV files are allowed")
 
@@ -38,12 +43,14 @@ async def upload_file(
 
     with open(file_location, "wb+") as file_object:
         shutil.copyfileobj(file.file, file_object)
+    record_file_size(file_location)
 
     db_file = FileDB(
         filename=file.filename,
         filepath=file_location,
         owner_id=current_user.id
     )
+    db_file.column_schema = await run_in_threadpool(infer_schema_or_failure, file_location)
     db.add(db_file)
     db.commit()
     db.refresh(db_file)
@@ -71,6 +78,27 @@ def get_file(
     return db_file
 
 
+@router.get("/files/{file_id}/schema", response_model=FileSchemaResponse)
+def get_file_schema(
+    file_id: str,
+    current_user: UserDB = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    from csv_schema import ensure_schema, schema_error
+
+    db_file = db.query(FileDB).filter(FileDB.id == file_id, FileDB.owner_id == current_user.id).first()
+    if not db_file:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    if not os.path.exists(db_file.filepath):
+        raise HTTPException(status_code=404, detail="File not found on disk")
+
+    schema = ensure_schema(db, db_file)
+    if schema is None:
+        raise HTTPException(status_code=500, detail=f"Error reading CSV file: {schema_error(db_file.column_schema)}")
+    return schema
+
+
 @router.put("/files/{file_id}", response_model=FileResponse)
 def update_file(
     file_id: str,
@@ -78,6 +106,8 @@ def update_file(
     current_user: UserDB = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
+    from csv_schema import snapshot_path
+
     db_file = db.query(FileDB).filter(FileDB.id == file_id, FileDB.owner_id == current_user.id).first()
     if not db_file:
         raise HTTPException(status_code=404, detail="File not found")
@@ -94,11 +124,13 @@ def update_file(
         if existing_file:
             raise HTTPException(status_code=400, detail="File with this name already exists")
 
-        # Rename file on disk
+        # Rename file (and its Parquet snapshot) on disk
         old_path = db_file.filepath
         new_path = os.path.join(UPLOAD_DIR, f"{current_user.id}_{file_update.filename}")
         try:
             os.rename(old_path, new_path)
+            if os.path.exists(snapshot_path(old_path)):
+                os.rename(snapshot_path(old_path), snapshot_path(new_path))
             db_file.filepath = new_path
         except OSError:
             raise HTTPException(status_code=500, detail="Error renaming file on disk")
@@ -115,13 +147,16 @@ def delete_file(
     current_user: UserDB = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
+    from csv_schema import snapshot_path
+
     db_file = db.query(FileDB).filter(FileDB.id == file_id, FileDB.owner_id == current_user.id).first()
     if not db_file:
         raise HTTPException(status_code=404, detail="File not found")
 
-    # Delete file from disk
-    if os.path.exists(db_file.filepath):
-        os.remove(db_file.filepath)
+    # Delete file and its Parquet snapshot from disk
+    for path in (db_file.filepath, snapshot_path(db_file.filepath)):
+        if os.path.exists(path):
+            os.remove(path)
 
     db.delete(db_file)
     db.commit()
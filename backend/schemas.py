@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, ConfigDict
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 
@@ -35,6 +35,21 @@ class FileResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class ColumnDtype(BaseModel):
+    name: str
+    dtype: Optional[str] = None
+
+
+class MemoryUsage(BaseModel):
+    default_bytes: int
+    optimized_bytes: int
+
+
+class FileSchemaResponse(BaseModel):
+    columns: List[ColumnDtype]
+    memory: MemoryUsage
+
+
 class FileUpdate(BaseModel):
     filename: str
 
@@ -1,5 +1,7 @@
 import os
+import subprocess
 import sys
+import time
 import pytest
 from fastapi.testclient import TestClient
 
@@ -27,6 +29,15 @@ def setup_db():
         os.remove("./test.db")
 
 
+def _auth_headers(username):
+    client.post(
+        "/register",
+        json={"username": username, "email": f"{username}@example.com", "password": "password123"},
+    )
+    token = client.post("/token", data={"username": username, "password": "password123"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
 def test_read_main():
     response = client.get("/")
     assert response.status_code == 401  # Should be unauthorized without token
@@ -86,3 +97,384 @@ def test_duplicate_registration():
     )
     assert response.status_code == 400
     assert response.json()["detail"] == "Username already taken"
+
+
+def test_metrics_endpoint():
+    client.get("/")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert 'http_request_duration_seconds_count{method="GET",route="/",size_bucket="none",status="401"}' in body
+    assert "db_query_duration_seconds" in body
+
+
+def test_analytics_records_stage_metrics():
+    headers = _auth_headers("metricsuser")
+    response = client.post("/upload", files={"file": ("metrics.csv", b"a,b\n1,x\n2,y\n")}, headers=headers)
+    file_id = response.json()["id"]
+
+    try:
+        assert client.get(f"/analytics/{file_id}", headers=headers).status_code == 200
+        body = client.get("/metrics").text
+        assert 'stage_duration_seconds_count{size_bucket="lt_1mb",stage="read_csv"}' in body
+        assert 'stage_duration_seconds_count{size_bucket="lt_1mb",stage="stats"}' in body
+        assert (
+            'http_request_duration_seconds_count{method="GET",route="/analytics/{file_id}",'
+            'size_bucket="lt_1mb",status="200"}'
+        ) in body
+    finally:
+        client.delete(f"/files/{file_id}", headers=headers)
+
+
+def test_request_span_named_after_route(monkeypatch):
+    pytest.importorskip("opentelemetry.sdk")
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+    import metrics
+
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    monkeypatch.setattr(metrics, "_tracer", provider.get_tracer(__name__))
+
+    headers = _auth_headers("traceuser")
+    client.get("/analytics/does-not-exist", headers=headers)
+
+    request_span = next(s for s in exporter.get_finished_spans() if s.name.startswith("GET /analytics"))
+    assert request_span.name == "GET /analytics/{file_id}"
+    assert request_span.attributes["http.route"] == "/analytics/{file_id}"
+
+
+def test_import_does_not_load_data_stack():
+    # pandas/numpy are imported on first use so cold workers start quickly
+    code = "import sys, main; print('pandas' in sys.modules, 'numpy' in sys.modules)"
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        env=dict(os.environ, DATABASE_URL="sqlite://"),
+        capture_output=True, text=True, check=True,
+    )
+    assert result.stdout.split() == ["False", "False"]
+
+
+def _wait_for(started_client, path, status_code):
+    for _ in range(50):
+        response = started_client.get(path)
+        if response.status_code == status_code:
+            break
+        time.sleep(0.1)
+    return response
+
+
+def test_liveness_and_readiness():
+    assert client.get("/healthz").json() == {"status": "ok"}
+
+    with TestClient(app) as started_client:
+        response = _wait_for(started_client, "/readyz", 200)
+        assert response.status_code == 200
+        assert response.json()["database"] is True
+
+
+def test_database_init_retries_until_available(monkeypatch):
+    import main
+    from sqlalchemy.exc import OperationalError
+
+    attempts = []
+
+    def flaky_init_db():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise OperationalError("SELECT 1", {}, Exception("connection refused"))
+
+    monkeypatch.setattr(main, "init_db", flaky_init_db)
+    monkeypatch.setattr(main, "DB_INIT_RETRY_DELAY", 0.01)
+
+    with TestClient(app) as started_client:
+        assert _wait_for(started_client, "/readyz", 200).status_code == 200
+        assert started_client.get("/healthz").status_code == 200
+    assert len(attempts) == 3
+
+
+def test_database_init_failure_fails_liveness(monkeypatch):
+    import main
+
+    def broken_init_db():
+        raise RuntimeError("bad schema")
+
+    monkeypatch.setattr(main, "init_db", broken_init_db)
+    # Restore the flag afterwards so the module-level client sees a healthy app again
+    monkeypatch.setattr(app.state, "db_init_failed", False, raising=False)
+
+    with TestClient(app) as started_client:
+        response = _wait_for(started_client, "/healthz", 503)
+        assert response.status_code == 503
+        assert response.json() == {"status": "failed", "database": False}
+        assert started_client.get("/readyz").status_code == 503
+
+
+def test_upload_infers_typed_schema():
+    headers = _auth_headers("schemauser")
+    csv = (
+        "id,score,region,created,active,note\n"
+        "1,10,north,2024-01-05,True,first note\n"
+        "2,,north,2024-02-10,,second note\n"
+        "3,30,south,,False,third note\n"
+        "4,40,north,2024-03-15,True,fourth note\n"
+    )
+    response = client.post("/upload", files={"file": ("typed.csv", csv.encode())}, headers=headers)
+    assert response.status_code == 200
+    file_id = response.json()["id"]
+
+    try:
+        schema = client.get(f"/files/{file_id}/schema", headers=headers).json()
+        dtypes = {c["name"]: c["dtype"] for c in schema["columns"]}
+        assert dtypes == {
+            "id": "int32",
+            "score": "Int32",
+            "region": "category",
+            "created": "datetime",
+            "active": "boolean",
+            "note": "string[pyarrow]",
+        }
+        assert schema["memory"]["optimized_bytes"] < schema["memory"]["default_bytes"]
+
+        columns = {c["name"]: c for c in client.get(f"/analytics/{file_id}", headers=headers).json()["columns"]}
+        assert columns["score"]["type"] == "Integer"
+        assert columns["score"]["stats"]["missing_values"] == 1
+        assert columns["active"]["stats"] == {
+            "missing_values": 1, "total_count": 4, "true_count": 2, "false_count": 1,
+        }
+        assert columns["created"]["type"] == "Date"
+        assert columns["created"]["stats"]["min"].startswith("2024-01-05")
+
+        data = client.get(f"/analytics/{file_id}/data", headers=headers).json()
+        assert data["score"] == [10, None, 30, 40]
+        assert data["region"] == ["north", "north", "south", "north"]
+        assert data["created"] == ["2024-01-05", "2024-02-10", None, "2024-03-15"]
+        assert data["active"] == [True, None, False, True]
+    finally:
+        client.delete(f"/files/{file_id}", headers=headers)
+
+
+def test_schema_treats_mixed_utc_offsets_as_strings():
+    headers = _auth_headers("dstuser")
+    csv = (
+        "n,local,fixed\n"
+        "1,2024-01-01T00:00:00+01:00,2024-01-01T00:00:00+01:00\n"
+        "2,2024-06-01T00:00:00+02:00,2024-06-01T00:00:00+01:00\n"
+    )
+    file_id = client.post("/upload", files={"file": ("dst.csv", csv.encode())}, headers=headers).json()["id"]
+
+    try:
+        response = client.get(f"/files/{file_id}/schema", headers=headers)
+        assert response.status_code == 200
+        dtypes = {c["name"]: c["dtype"] for c in response.json()["columns"]}
+        assert dtypes == {"n": "int32", "local": "string[pyarrow]", "fixed": "datetime"}
+
+        params = [("columns", "local"), ("filter", "n:gte:2")]
+        data = client.get(f"/analytics/{file_id}/data", params=params, headers=headers).json()
+        assert data == {"local": ["2024-06-01T00:00:00+02:00"]}
+    finally:
+        client.delete(f"/files/{file_id}", headers=headers)
+
+
+def test_data_preview_keeps_datetime_precision_and_offset():
+    headers = _auth_headers("precisionuser")
+    csv = (
+        "at,local\n"
+        "2024-01-01T10:00:00.250,2024-01-01T09:30:00+01:00\n"
+        "2024-01-02T11:00:00,2024-01-02T00:00:00+01:00\n"
+    )
+    file_id = client.post("/upload", files={"file": ("times.csv", csv.encode())}, headers=headers).json()["id"]
+
+    try:
+        data = client.get(f"/analytics/{file_id}/data", headers=headers).json()
+        assert data["at"] == ["2024-01-01T10:00:00.250000", "2024-01-02T11:00:00"]
+        assert data["local"] == ["2024-01-01T09:30:00+01:00", "2024-01-02T00:00:00+01:00"]
+    finally:
+        client.delete(f"/files/{file_id}", headers=headers)
+
+
+def test_schema_checks_every_date_value():
+    headers = _auth_headers("latebaddateuser")
+    rows = ["2024-01-01"] * 1500 + ["2024-13-45"] + ["2024-01-02"] * 99
+    csv = "day\n" + "\n".join(rows) + "\n"
+    file_id = client.post("/upload", files={"file": ("late.csv", csv.encode())}, headers=headers).json()["id"]
+
+    try:
+        schema = client.get(f"/files/{file_id}/schema", headers=headers).json()
+        assert schema["columns"][0]["dtype"] == "category"
+        assert client.get(f"/analytics/{file_id}/data", headers=headers).json()["day"][1500] == "2024-13-45"
+    finally:
+        client.delete(f"/files/{file_id}", headers=headers)
+
+
+def test_schema_keeps_float_for_integral_values_beyond_int64():
+    headers = _auth_headers("bigfloatuser")
+    response = client.post("/upload", files={"file": ("big.csv", b"big,small\n1e30,1\n2e30,2\n")}, headers=headers)
+    file_id = response.json()["id"]
+
+    try:
+        schema = client.get(f"/files/{file_id}/schema", headers=headers).json()
+        assert {c["name"]: c["dtype"] for c in schema["columns"]} == {"big": "float64", "small": "int32"}
+        assert client.get(f"/analytics/{file_id}/data", headers=headers).json()["big"] == [1e30, 2e30]
+    finally:
+        client.delete(f"/files/{file_id}", headers=headers)
+
+
+def test_failed_schema_inference_is_not_retried(monkeypatch):
+    import csv_schema
+
+    headers = _auth_headers("badcsvuser")
+    response = client.post("/upload", files={"file": ("bad.csv", b"a,b\n1,2\n1,2,3,4\n")}, headers=headers)
+    file_id = response.json()["id"]
+
+    def fail_if_called(filepath):
+        raise AssertionError("schema inference should not be retried")
+
+    monkeypatch.setattr(csv_schema, "infer_schema", fail_if_called)
+    try:
+        for path in (f"/files/{file_id}/schema", f"/analytics/{file_id}", f"/analytics/{file_id}/data"):
+            response = client.get(path, headers=headers)
+            assert response.status_code == 500
+            assert "Expected 2 fields" in response.json()["detail"]
+
+        for params in ([("columns", "a")], [("filter", "a:eq:1")]):
+            response = client.get(f"/analytics/{file_id}/data", params=params, headers=headers)
+            assert response.status_code == 400
+            assert "schema could not be inferred (Error tokenizing data" in response.json()["detail"]
+    finally:
+        client.delete(f"/files/{file_id}", headers=headers)
+
+
+@pytest.mark.parametrize("use_snapshot", [True, False])
+def test_column_projection_and_filters(use_snapshot):
+    from csv_schema import snapshot_path
+    from models import FileDB
+    from database import SessionLocal
+
+    headers = _auth_headers(f"filteruser{int(use_snapshot)}")
+    csv = (
+        "id,score,region,created\n"
+        "1,10,north,2024-01-05\n"
+        "2,,north,2024-02-10\n"
+        "3,30,south,\n"
+        "4,40,north,2024-03-15\n"
+    )
+    response = client.post("/upload", files={"file": ("filtered.csv", csv.encode())}, headers=headers)
+    file_id = response.json()["id"]
+
+    try:
+        db = SessionLocal()
+        filepath = db.query(FileDB).filter(FileDB.id == file_id).first().filepath
+        db.close()
+        assert os.path.exists(snapshot_path(filepath))
+        if not use_snapshot:
+            os.remove(snapshot_path(filepath))
+
+        params = [("columns", "id"), ("columns", "score"), ("filter", "region:eq:north"), ("filter", "score:gte:10")]
+        data = client.get(f"/analytics/{file_id}/data", params=params, headers=headers).json()
+        assert data == {"id": [1, 4], "score": [10, 40]}
+
+        params = [("filter", "score:is_null")]
+        data = client.get(f"/analytics/{file_id}/data", params=params, headers=headers).json()
+        assert data["id"] == [2]
+
+        params = [("columns", "score"), ("filter", "created:lt:2024-03-01")]
+        analytics = client.get(f"/analytics/{file_id}", params=params, headers=headers).json()
+        assert [c["name"] for c in analytics["columns"]] == ["score"]
+        assert analytics["columns"][0]["stats"]["total_count"] == 2
+        assert analytics["columns"][0]["stats"]["missing_values"] == 1
+
+        # Same request again is served from the stats cache
+        assert client.get(f"/analytics/{file_id}", params=params, headers=headers).json() == analytics
+        assert 'stats_cache_lookups_total{result="hit"}' in client.get("/metrics").text
+
+        response = client.get(f"/analytics/{file_id}", params=[("filter", "score:between:1")], headers=headers)
+        assert response.status_code == 400
+        response = client.get(f"/analytics/{file_id}/data", params=[("columns", "missing")], headers=headers)
+        assert response.status_code == 400
+        response = client.get(f"/analytics/{file_id}/data", params=[("filter", "score:gt:abc")], headers=headers)
+        assert response.status_code == 400
+    finally:
+        client.delete(f"/files/{file_id}", headers=headers)
+
+
+@pytest.mark.parametrize("use_snapshot", [True, False])
+def test_integer_filter_keeps_int64_precision(use_snapshot):
+    from csv_schema import snapshot_path
+    from models import FileDB
+    from database import SessionLocal
+
+    headers = _auth_headers(f"bigintuser{int(use_snapshot)}")
+    csv = b"id,label\n9007199254740992,a\n9007199254740993,b\n"
+    file_id = client.post("/upload", files={"file": ("bigint.csv", csv)}, headers=headers).json()["id"]
+
+    try:
+        if not use_snapshot:
+            db = SessionLocal()
+            os.remove(snapshot_path(db.query(FileDB).filter(FileDB.id == file_id).first().filepath))
+            db.close()
+
+        params = [("filter", "id:eq:9007199254740993")]
+        data = client.get(f"/analytics/{file_id}/data", params=params, headers=headers).json()
+        assert data == {"id": [9007199254740993], "label": ["b"]}
+    finally:
+        client.delete(f"/files/{file_id}", headers=headers)
+
+
+def test_concurrent_snapshot_writes_and_corrupt_snapshot():
+    from concurrent.futures import ThreadPoolExecutor
+    from csv_schema import infer_schema, scan_with_schema, snapshot_path
+    from models import FileDB
+    from database import SessionLocal
+
+    headers = _auth_headers("snapshotuser")
+    csv = b"id,region\n1,north\n2,south\n3,north\n"
+    file_id = client.post("/upload", files={"file": ("snap.csv", csv)}, headers=headers).json()["id"]
+
+    try:
+        db = SessionLocal()
+        filepath = db.query(FileDB).filter(FileDB.id == file_id).first().filepath
+        db.close()
+        schema = infer_schema(filepath)
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(lambda _: scan_with_schema(filepath, schema, write_snapshot=True), range(4)))
+        assert all(written for _, written in results)
+        assert not [n for n in os.listdir(os.path.dirname(filepath)) if n.endswith(".tmp")]
+
+        with open(snapshot_path(filepath), "wb") as f:
+            f.write(b"not parquet")
+        params = [("filter", "region:eq:north")]
+        data = client.get(f"/analytics/{file_id}/data", params=params, headers=headers).json()
+        assert data == {"id": [1, 3], "region": ["north", "north"]}
+    finally:
+        client.delete(f"/files/{file_id}", headers=headers)
+
+
+@pytest.mark.parametrize("use_snapshot", [True, False])
+@pytest.mark.parametrize("value", ["99999999999999999999", "-99999999999999999999", "1e30", "nan"])
+def test_integer_filter_out_of_int64_range_is_rejected(use_snapshot, value):
+    from csv_schema import snapshot_path
+    from models import FileDB
+    from database import SessionLocal
+
+    headers = _auth_headers(f"rangeuser{int(use_snapshot)}")
+    csv = b"id,label\n1,a\n2,b\n"
+    file_id = client.post("/upload", files={"file": ("range.csv", csv)}, headers=headers).json()["id"]
+
+    try:
+        if not use_snapshot:
+            db = SessionLocal()
+            os.remove(snapshot_path(db.query(FileDB).filter(FileDB.id == file_id).first().filepath))
+            db.close()
+
+        for path in (f"/analytics/{file_id}", f"/analytics/{file_id}/data"):
+            response = client.get(path, params=[("filter", f"id:gt:{value}")], headers=headers)
+            assert response.status_code == 400
+            assert "out of range" in response.json()["detail"]
+    finally:
+        client.delete(f"/files/{file_id}", headers=headers)
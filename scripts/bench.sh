@@ -0,0 +1,30 @@
+#!/bin/bash
+set -e
+
+echo "Running Backend Benchmarks..."
+# Results are saved as JSON under backend/benchmarks/.results, one file per run,
+# named after the current commit. Compare runs with:
+#   pytest-benchmark --storage backend/benchmarks/.results compare
+# Dataset sizes (MB) are set with BENCH_SIZES_MB, e.g. BENCH_SIZES_MB=1,100,2048
+cd backend
+
+if [ -f ".venv/Scripts/python.exe" ]; then
+    PYTHON_CMD=".venv/Scripts/python.exe"
+elif [ -f ".venv/bin/python" ]; then
+    PYTHON_CMD=".venv/bin/python"
+elif [ -f "../.venv/Scripts/python.exe" ]; then
+    PYTHON_CMD="../.venv/Scripts/python.exe"
+elif [ -f "../.venv/bin/python" ]; then
+    PYTHON_CMD="../.venv/bin/python"
+else
+    PYTHON_CMD="python"
+fi
+
+$PYTHON_CMD -m pytest benchmarks \
+    --benchmark-autosave \
+    --benchmark-storage=benchmarks/.results \
+    --benchmark-sort=fullname \
+    "$@"
+cd ..
+
+echo "Benchmarks Complete!"